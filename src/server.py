@@ -1,11 +1,34 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+import anyio
 from mcp.server.fastmcp import FastMCP
 from registry import register_all_tools
+from tools.snapshot_url import close_browser
+
+try:
+    import uvloop  # noqa: F401
+except ImportError:  # uvloop is not available on Windows
+    use_uvloop = False
+else:
+    use_uvloop = True
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """Close the shared Playwright browser when the server shuts down."""
+    try:
+        yield
+    finally:
+        await close_browser()
+
 
 # Create an MCP server
-mcp = FastMCP("Website Snapshot")
+mcp = FastMCP("Website Snapshot", lifespan=lifespan)
 
 # Register all tools
 register_all_tools(mcp)
 
 if __name__ == "__main__":
-    mcp.run()
+    # Same as mcp.run() over stdio, but on uvloop when it is installed
+    anyio.run(mcp.run_stdio_async, backend_options={"use_uvloop": use_uvloop})
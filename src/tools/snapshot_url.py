@@ -1,10 +1,22 @@
-from typing import Optional, List, Dict, Any
+import asyncio
+import re
+from typing import Optional, List, Dict, Any, Mapping, Tuple
 from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
 
 from mcp.types import TextContent
-from playwright.async_api import async_playwright, Response, Request
+from playwright.async_api import (
+    async_playwright,
+    Browser,
+    BrowserContext,
+    Page,
+    Playwright,
+    Response,
+    Request,
+    Route,
+)
 from pydantic import BaseModel, Field
-from urllib.parse import urlparse
 
 
 class AuthenticatedSnapshotArgs(BaseModel):
@@ -17,7 +29,7 @@ class AuthenticatedSnapshotArgs(BaseModel):
     include_console: bool = Field(default=True, description="Include console messages")
 
 
-@dataclass
+@dataclass(slots=True)
 class NetworkRequest:
     request: Optional[Request] = None
     response: Optional[Response] = None
@@ -31,28 +43,109 @@ CONFIG = {
     "timeout": 15000,
 }
 
+# Scheme followed by a non-empty network location
+_URL_RE = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.\-]*://[^/?#]+")
+
+# Cleanup urlparse applies before parsing: leading C0 controls and spaces are
+# stripped, and tabs/newlines are dropped anywhere in the URL
+_URL_LEADING_JUNK = "".join(chr(c) for c in range(0x21))
+_URL_UNSAFE_CHARS = str.maketrans("", "", "\t\r\n")
+
+# Largest response body, in bytes, kept for the output
+_MAX_BODY_LENGTH = 50000
+
+# Content types whose response body is included in the output
+_SHOWABLE_PREFIXES = ("application/json", "text/", "application/xml")
+
+# Request methods whose body is captured
+_BODY_METHODS = frozenset({"POST", "PUT", "PATCH"})
+
+# Resources the snapshot never needs; stylesheets are kept because they decide
+# which elements are hidden from the accessibility tree. Blocking them means
+# routing every request on the shared contexts, which disables Chromium's HTTP
+# cache there and sends each request through a Python round trip: snapshots
+# share cookies and storage, but never get cached subresources
+_BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "media"})
+
+# Lines of the ARIA snapshot that get an element reference
+_ELEM_KEYWORDS = ("button", "link", "input", "textbox")
+
+# Upper bound on response bodies fetched from the browser at once
+_BODY_SEM = asyncio.Semaphore(32)
+
+# Response.body() waits for the response to finish, which streams and long
+# polls never do, so each fetch and each drain of the body queue is bounded
+_BODY_FETCH_TIMEOUT = 2.0
+_MAX_BODY_DRAIN_ROUNDS = 3
+
+# Playwright driver, Chromium and one context per configuration are created
+# once and shared by every call; each call only opens its own page. Contexts
+# share cookies and storage but no HTTP cache (see _BLOCKED_RESOURCE_TYPES)
+_browser_lock = asyncio.Lock()
+_playwright: Optional[Playwright] = None
+_browser: Optional[Browser] = None
+_contexts: Dict[Tuple[Any, ...], BrowserContext] = {}
+
+
+async def _ensure_browser() -> Browser:
+    """Launch the shared browser if needed; the caller holds _browser_lock."""
+    global _playwright, _browser
+
+    if _browser is None or not _browser.is_connected():
+        if _playwright is None:
+            _playwright = await async_playwright().start()
+        _browser = await _playwright.chromium.launch(headless=True)
+        _contexts.clear()
+    return _browser
+
+
+async def _get_context(viewport: Dict[str, int], user_agent: str) -> BrowserContext:
+    key = (tuple(viewport.items()), user_agent)
+
+    # One acquisition covers the relaunch and the lookup, so a context is
+    # never created on a browser that was replaced in between
+    async with _browser_lock:
+        browser = await _ensure_browser()
+        context = _contexts.get(key)
+        if context is None:
+            context = await browser.new_context(
+                viewport=viewport, user_agent=user_agent
+            )
+            await context.route("**/*", _block_unneeded_resources)
+            _contexts[key] = context
+        return context
+
+
+async def close_browser() -> None:
+    """Shut down the shared browser and Playwright driver, if running."""
+    global _playwright, _browser
+
+    async with _browser_lock:
+        _contexts.clear()
+        if _browser is not None:
+            await _browser.close()
+            _browser = None
+        if _playwright is not None:
+            await _playwright.stop()
+            _playwright = None
+
 
 def should_show_content(content_type: str, content_length: int) -> bool:
-    return content_length <= 50000 and any(
-        content_type.startswith(t)
-        for t in ["application/json", "text/", "application/xml"]
+    return content_length <= _MAX_BODY_LENGTH and content_type.startswith(
+        _SHOWABLE_PREFIXES
     )
 
 
+def _format_request(req: NetworkRequest) -> str:
+    status = req.response.status if req.response else "Pending"
+    body = f"\n   Response: {req.response_body[:200]}..." if req.response_body else ""
+    return f"🌐 {req.request.method} {req.request.url}\n   Status: {status}{body}"
+
+
 def format_requests(requests: List[NetworkRequest]) -> str:
     if not requests:
         return "No requests captured"
-
-    formatted = []
-    for req in requests:
-        if req.request:
-            formatted.append(f"🌐 {req.request.method} {req.request.url}")
-            formatted.append(
-                f"   Status: {req.response.status if req.response else 'Pending'}"
-            )
-            if req.response_body:
-                formatted.append(f"   Response: {req.response_body[:200]}...")
-    return "\n".join(formatted)
+    return "\n".join([_format_request(req) for req in requests if req.request])
 
 
 def format_console(messages: List[Any]) -> str:
@@ -66,40 +159,94 @@ def format_console(messages: List[Any]) -> str:
     )
 
 
-def add_element_refs(snapshot: str) -> str:
-    lines = snapshot.split("\n")
-    ref_counter = 1
+def _element_line_ends(snapshot: str) -> List[int]:
+    """Offsets of the end of every line that mentions an interactive element."""
+    lowered = snapshot.lower()
+    if len(lowered) != len(snapshot):
+        # Some characters grow when lowercased, so offsets would not line up;
+        # lowercase line by line instead, which is what decides a match
+        line_ends = []
+        end = -1
+        for line in snapshot.split("\n"):
+            end += len(line) + 1
+            if any(keyword in line.lower() for keyword in _ELEM_KEYWORDS):
+                line_ends.append(end)
+        return line_ends
+
+    # str.find skips ahead through the text far faster than a regex
+    # alternation, so search for each keyword separately and merge the lines
+    line_ends = set()
+    find = lowered.find
+    for keyword in _ELEM_KEYWORDS:
+        index = find(keyword)
+        while index >= 0:
+            end = find("\n", index)
+            if end < 0:
+                end = len(lowered)
+            line_ends.add(end)
+            index = find(keyword, end)
+    return sorted(line_ends)
+
+
+def annotate_and_parse(snapshot: str) -> Tuple[str, List[Dict[str, str]], str]:
+    """
+    Append [ref=N] to interactive lines and collect them in a single pass.
+    Returns the annotated snapshot, the refs and their "[ref=N]: element" listing.
+    """
+    refs: List[Dict[str, str]] = []
+    ref_lines: List[str] = []
+    parts: List[str] = []
+    start = 0
 
-    for i, line in enumerate(lines):
-        if any(
-            keyword in line.lower()
-            for keyword in ["button", "link", "input", "textbox"]
-        ):
-            lines[i] = f"{line} [ref={ref_counter}]"
-            ref_counter += 1
+    for ref, end in enumerate(_element_line_ends(snapshot), 1):
+        element = snapshot[snapshot.rfind("\n", 0, end) + 1 : end].strip()
+        refs.append({"ref": str(ref), "element": element})
+        ref_lines.append(f"[ref={ref}]: {element}")
+        parts.append(snapshot[start:end])
+        parts.append(f" [ref={ref}]")
+        start = end
 
-    return "\n".join(lines)
+    parts.append(snapshot[start:])
+    return "".join(parts), refs, "\n".join(ref_lines)
 
 
-def parse_refs(snapshot: str) -> List[Dict[str, str]]:
-    refs = []
-    for line in snapshot.split("\n"):
-        if "[ref=" in line:
-            ref_start = line.find("[ref=") + 5
-            ref_end = line.find("]", ref_start)
-            if ref_end > ref_start:
-                refs.append(
-                    {
-                        "ref": line[ref_start:ref_end],
-                        "element": line[: line.find("[ref=")].strip(),
-                    }
-                )
-    return refs
+async def _block_unneeded_resources(route: Route) -> None:
+    if route.request.resource_type in _BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def _fetch_body(entry: NetworkRequest, response: Response) -> None:
+    async with _BODY_SEM:
+        try:
+            body = await asyncio.wait_for(response.body(), _BODY_FETCH_TIMEOUT)
+            # content-length may be missing or describe the compressed size,
+            # so cap the decoded preview; the cut may split a multibyte character
+            entry.response_body = body[:_MAX_BODY_LENGTH].decode(errors="replace")
+        except asyncio.TimeoutError:
+            entry.response_body = "[body unavailable]"
+        except Exception:
+            entry.response_body = "[Error reading response]"
+
+
+@lru_cache(maxsize=128)
+def _build_snapshot_output(
+    aria_snapshot: str,
+) -> Tuple[str, Tuple[Mapping[str, str], ...], str]:
+    """Annotate a snapshot and parse its refs, memoized on the snapshot text."""
+    snapshot_with_refs, refs, ref_listing = annotate_and_parse(aria_snapshot)
+    # Every cache hit shares these, so hand out read-only views
+    return (
+        snapshot_with_refs,
+        tuple(MappingProxyType(ref) for ref in refs),
+        ref_listing,
+    )
 
 
 def is_valid_url(url: str) -> bool:
-    parsed = urlparse(url)
-    return all([parsed.scheme, parsed.netloc])
+    url = url.lstrip(_URL_LEADING_JUNK).translate(_URL_UNSAFE_CHARS)
+    return bool(_URL_RE.match(url))
 
 
 async def website_snapshot(target_url: str) -> List[TextContent]:
@@ -115,114 +262,137 @@ async def website_snapshot(target_url: str) -> List[TextContent]:
             )
         ]
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
+    page: Optional[Page] = None
+    try:
+        context = await _get_context(CONFIG["viewport"], CONFIG["user_agent"])
+        page = await context.new_page()
+        page.set_default_timeout(CONFIG["timeout"])
+
+        network_requests: List[NetworkRequest] = []
+        by_request: Dict[Request, NetworkRequest] = {}
+        pending_bodies: List[Tuple[NetworkRequest, Response]] = []
+        console_messages: List[Any] = []
+
+        # Setup monitoring
+        page.on("console", lambda msg: console_messages.append(msg))
+
+        def handle_request(request: Request):
+            # Blocked resources are aborted by the route and never answered
+            if request.resource_type in _BLOCKED_RESOURCE_TYPES:
+                return
+
+            request_body = None
+            if request.method.upper() in _BODY_METHODS:
+                try:
+                    request_body = request.post_data
+                except Exception:
+                    pass
+            entry = NetworkRequest(request=request, request_body=request_body)
+            network_requests.append(entry)
+            by_request[request] = entry
+
+        def handle_response(response: Response):
+            entry = by_request.get(response.request)
+            if entry is None or entry.response:
+                return
+
+            entry.response = response
+            try:
+                headers = response.headers
+                content_type = headers.get("content-type", "")
+                content_length = int(headers.get("content-length", "0"))
+
+                if should_show_content(content_type, content_length):
+                    pending_bodies.append((entry, response))
+                else:
+                    entry.response_body = f"[{content_type} - {content_length} bytes]"
+            except Exception:
+                entry.response_body = "[Error reading response]"
 
-        try:
-            context = await browser.new_context(
-                viewport=CONFIG["viewport"], user_agent=CONFIG["user_agent"]
-            )
+        async def fetch_pending_bodies():
+            # Responses keep arriving while bodies load, so drain a few rounds;
+            # a page that polls constantly would otherwise never let us finish
+            for _ in range(_MAX_BODY_DRAIN_ROUNDS):
+                if not pending_bodies:
+                    return
+                batch = pending_bodies.copy()
+                pending_bodies.clear()
+                await asyncio.gather(*(_fetch_body(*pending) for pending in batch))
+
+            for entry, _ in pending_bodies:
+                entry.response_body = "[body unavailable]"
+            pending_bodies.clear()
+
+        page.on("request", handle_request)
+        page.on("response", handle_response)
 
-            page = await context.new_page()
-            page.set_default_timeout(CONFIG["timeout"])
-
-            network_requests: List[NetworkRequest] = []
-            console_messages: List[Any] = []
-
-            # Setup monitoring
-            page.on("console", lambda msg: console_messages.append(msg))
-
-            async def handle_request(request: Request):
-                request_body = None
-                if request.method.upper() in ["POST", "PUT", "PATCH"]:
-                    try:
-                        request_body = await request.post_data()
-                    except Exception:
-                        pass
-                network_requests.append(
-                    NetworkRequest(request=request, request_body=request_body)
-                )
-
-            async def handle_response(response: Response):
-                for entry in network_requests:
-                    if entry.request == response.request and not entry.response:
-                        entry.response = response
-                        try:
-                            content_type = response.headers.get("content-type", "")
-                            content_length = int(
-                                response.headers.get("content-length", "0")
-                            )
-
-                            if should_show_content(content_type, content_length):
-                                entry.response_body = await response.text()
-                            else:
-                                entry.response_body = (
-                                    f"[{content_type} - {content_length} bytes]"
-                                )
-                        except Exception:
-                            entry.response_body = "[Error reading response]"
-                        break
-
-            page.on("request", handle_request)
-            page.on("response", handle_response)
-
-            # Navigate to target and capture snapshot
-            await page.goto(target_url, wait_until="domcontentloaded")
-            await page.wait_for_load_state("load", timeout=CONFIG["timeout"])
+        # Navigate to target and capture snapshot
+        await page.goto(target_url, wait_until="domcontentloaded")
+        await page.wait_for_load_state("load", timeout=CONFIG["timeout"])
 
+        try:
+            await page.wait_for_selector(
+                "[data-testid], button, .MuiButton-root", timeout=10000
+            )
+        except Exception:
+            # Give the page up to 3s to go quiet instead of always sleeping
             try:
-                await page.wait_for_selector(
-                    "[data-testid], button, .MuiButton-root", timeout=10000
-                )
+                await page.wait_for_load_state("networkidle", timeout=3000)
             except Exception:
-                await page.wait_for_timeout(3000)
-
-            # Capture snapshot
-            aria_snapshot = await page.locator("body").aria_snapshot()
-            snapshot_with_refs = add_element_refs(aria_snapshot)
-            element_refs = parse_refs(snapshot_with_refs)
-
-            # Format output
-            output_parts = [
-                f"🔍 {await page.title()}",
-                f"📍 {page.url}",
-                "",
-                "🎭 Accessibility Snapshot:",
-                snapshot_with_refs,
-            ]
-
-            output_parts.extend(
-                ["", "🌐 Network Requests:", format_requests(network_requests)]
-            )
+                pass
+
+        # Fetch queued response bodies concurrently
+        await fetch_pending_bodies()
+
+        # Capture snapshot and title in parallel
+        aria_snapshot, title = await asyncio.gather(
+            page.locator("body").aria_snapshot(),
+            page.title(),
+        )
+        # Pick up responses that arrived during the capture; nothing is awaited
+        # after this, so every queued response ends up with a body or placeholder
+        await fetch_pending_bodies()
+        snapshot_with_refs, element_refs, ref_listing = _build_snapshot_output(
+            aria_snapshot
+        )
+
+        # Format output
+        output_parts = [
+            f"🔍 {title}",
+            f"📍 {page.url}",
+            "",
+            "🎭 Accessibility Snapshot:",
+            snapshot_with_refs,
+        ]
 
-            output_parts.extend(["", "🖥️ Console:", format_console(console_messages)])
+        output_parts.extend(
+            ["", "🌐 Network Requests:", format_requests(network_requests)]
+        )
 
-            summary_parts = [f"{len(element_refs)} elements"]
+        output_parts.extend(["", "🖥️ Console:", format_console(console_messages)])
 
-            summary_parts.append(
-                f"{len([r for r in network_requests if r.request])} requests"
-            )
+        summary_parts = [f"{len(element_refs)} elements"]
+
+        summary_parts.append(
+            f"{len([r for r in network_requests if r.request])} requests"
+        )
+
+        summary_parts.append(f"{len(console_messages)} console messages")
+
+        return [
+            TextContent(
+                type="text",
+                text=f"✅ Captured snapshot with {', '.join(summary_parts)}",
+            ),
+            TextContent(type="text", text="\n".join(output_parts)),
+            TextContent(
+                type="text",
+                text=f"🎯 Element References:\n{ref_listing}",
+            ),
+        ]
 
-            summary_parts.append(f"{len(console_messages)} console messages")
-
-            await context.close()
-
-            return [
-                TextContent(
-                    type="text",
-                    text=f"✅ Captured snapshot with {', '.join(summary_parts)}",
-                ),
-                TextContent(type="text", text="\n".join(output_parts)),
-                TextContent(
-                    type="text",
-                    text="🎯 Element References:\n"
-                    + "\n".join(
-                        [f"[ref={r['ref']}]: {r['element']}" for r in element_refs]
-                    ),
-                ),
-            ]
-
-        except Exception as error:
-            return [TextContent(type="text", text=f"❌ Failed: {str(error)}")]
-        finally:
-            await browser.close()
+    except Exception as error:
+        return [TextContent(type="text", text=f"❌ Failed: {str(error)}")]
+    finally:
+        if page is not None:
+            await page.close()
@@ -1,7 +1,22 @@
+import asyncio
+
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch, Mock
 from mcp.types import TextContent
-from src.tools.snapshot_url import website_snapshot
+from src.tools import snapshot_url
+from src.tools.snapshot_url import close_browser, website_snapshot
+
+
+@pytest.fixture(autouse=True)
+def reset_shared_browser():
+    """Start every test without a cached Playwright browser or context"""
+    snapshot_url._playwright = None
+    snapshot_url._browser = None
+    snapshot_url._contexts.clear()
+    yield
+    snapshot_url._playwright = None
+    snapshot_url._browser = None
+    snapshot_url._contexts.clear()
 
 
 @pytest.mark.asyncio
@@ -35,6 +50,7 @@ button "Login"
     mock_browser = AsyncMock()
     mock_browser.new_context = AsyncMock(return_value=mock_context)
     mock_browser.close = AsyncMock()
+    mock_browser.is_connected = MagicMock(return_value=True)
 
     mock_chromium = AsyncMock()
     mock_chromium.launch = AsyncMock(return_value=mock_browser)
@@ -43,7 +59,9 @@ button "Login"
     mock_playwright.chromium = mock_chromium
 
     with patch("src.tools.snapshot_url.async_playwright") as mock_async_playwright:
-        mock_async_playwright.return_value.__aenter__.return_value = mock_playwright
+        mock_async_playwright.return_value.start = AsyncMock(
+            return_value=mock_playwright
+        )
 
         result = await website_snapshot("https://example.com")
 
@@ -72,6 +90,10 @@ button "Login"
     assert '[ref=3]: textbox "Email"' in refs_text
     assert '[ref=4]: button "Login"' in refs_text
 
+    mock_context.route.assert_called_once_with(
+        "**/*", snapshot_url._block_unneeded_resources
+    )
+
 
 @pytest.mark.asyncio
 async def test_website_snapshot_with_network_and_console():
@@ -80,8 +102,21 @@ async def test_website_snapshot_with_network_and_console():
     # Create the mock request and response
     mock_request = Mock()
     mock_request.method = "GET"
+    mock_request.resource_type = "fetch"
     mock_request.url = "https://api.example.com/data"
-    mock_request.post_data = AsyncMock(return_value=None)
+    mock_request.post_data = None
+
+    mock_post_request = Mock()
+    mock_post_request.method = "POST"
+    mock_post_request.resource_type = "fetch"
+    mock_post_request.url = "https://api.example.com/track"
+    mock_post_request.post_data = '{"event": "view"}'
+
+    # Blocked by the route, so it must not be reported
+    mock_image_request = Mock()
+    mock_image_request.method = "GET"
+    mock_image_request.url = "https://example.com/logo.png"
+    mock_image_request.resource_type = "image"
 
     mock_response = Mock()
     mock_response.status = 200
@@ -90,7 +125,14 @@ async def test_website_snapshot_with_network_and_console():
         "content-type": "application/json",
         "content-length": "100",
     }
-    mock_response.text = AsyncMock(return_value='{"status": "ok"}')
+    mock_response.body = AsyncMock(return_value=b'{"status": "ok"}')
+
+    # Answered only while the snapshot is being captured
+    mock_post_response = Mock()
+    mock_post_response.status = 201
+    mock_post_response.request = mock_post_request
+    mock_post_response.headers = {"content-type": "text/plain"}
+    mock_post_response.body = AsyncMock(return_value=b"tracked")
 
     mock_console_msg = Mock()
     mock_console_msg.type = "log"
@@ -119,9 +161,11 @@ async def test_website_snapshot_with_network_and_console():
     async def mock_goto(*args, **kwargs):
         # Simulate request/response during navigation
         if request_handler:
-            await request_handler(mock_request)
+            request_handler(mock_request)
+            request_handler(mock_post_request)
+            request_handler(mock_image_request)
         if response_handler:
-            await response_handler(mock_response)
+            response_handler(mock_response)
         if console_handler:
             console_handler(mock_console_msg)
 
@@ -129,8 +173,12 @@ async def test_website_snapshot_with_network_and_console():
     mock_page.wait_for_load_state = AsyncMock()
     mock_page.wait_for_selector = AsyncMock()
 
+    async def mock_aria_snapshot():
+        response_handler(mock_post_response)
+        return 'button "Click Me"'
+
     mock_locator = AsyncMock()
-    mock_locator.aria_snapshot = AsyncMock(return_value='button "Click Me"')
+    mock_locator.aria_snapshot = AsyncMock(side_effect=mock_aria_snapshot)
     mock_page.locator = MagicMock(return_value=mock_locator)
 
     mock_context = AsyncMock()
@@ -140,6 +188,7 @@ async def test_website_snapshot_with_network_and_console():
     mock_browser = AsyncMock()
     mock_browser.new_context = AsyncMock(return_value=mock_context)
     mock_browser.close = AsyncMock()
+    mock_browser.is_connected = MagicMock(return_value=True)
 
     mock_chromium = AsyncMock()
     mock_chromium.launch = AsyncMock(return_value=mock_browser)
@@ -147,16 +196,27 @@ async def test_website_snapshot_with_network_and_console():
     mock_playwright = AsyncMock()
     mock_playwright.chromium = mock_chromium
 
-    with patch("src.tools.snapshot_url.async_playwright") as mock_async_playwright:
-        mock_async_playwright.return_value.__aenter__.return_value = mock_playwright
+    with (
+        patch("src.tools.snapshot_url.async_playwright") as mock_async_playwright,
+        patch(
+            "src.tools.snapshot_url.format_requests",
+            wraps=snapshot_url.format_requests,
+        ) as mock_format_requests,
+    ):
+        mock_async_playwright.return_value.start = AsyncMock(
+            return_value=mock_playwright
+        )
 
         result = await website_snapshot("https://example.com")
 
     assert len(result) == 3
 
+    post_entry = mock_format_requests.call_args.args[0][1]
+    assert post_entry.request_body == '{"event": "view"}'
+
     summary = result[0].text
     assert (
-        "✅ Captured snapshot with 1 elements, 1 requests, 1 console messages"
+        "✅ Captured snapshot with 1 elements, 2 requests, 1 console messages"
         in summary
     )
 
@@ -165,11 +225,112 @@ async def test_website_snapshot_with_network_and_console():
     assert "🌐 GET https://api.example.com/data" in snapshot_text
     assert "Status: 200" in snapshot_text
     assert 'Response: {"status": "ok"}' in snapshot_text
+    assert "🌐 POST https://api.example.com/track" in snapshot_text
+    assert "Status: 201" in snapshot_text
+    assert "Response: tracked" in snapshot_text
+    assert "logo.png" not in snapshot_text
 
     assert "🖥️ Console:" in snapshot_text
     assert "🖥️ [LOG] Page loaded successfully" in snapshot_text
 
 
+@pytest.mark.asyncio
+async def test_website_snapshot_bounds_body_fetches(monkeypatch):
+    """Test hanging and endlessly polling responses cannot block the snapshot"""
+
+    monkeypatch.setattr(snapshot_url, "_BODY_FETCH_TIMEOUT", 0.05)
+
+    request_handler = None
+    response_handler = None
+
+    def on_handler(event, handler):
+        nonlocal request_handler, response_handler
+        if event == "request":
+            request_handler = handler
+        elif event == "response":
+            response_handler = handler
+
+    def make_exchange(url, body):
+        mock_request = Mock()
+        mock_request.method = "GET"
+        mock_request.resource_type = "fetch"
+        mock_request.url = url
+
+        mock_response = Mock()
+        mock_response.status = 200
+        mock_response.request = mock_request
+        mock_response.headers = {"content-type": "text/event-stream"}
+        mock_response.body = body
+        return mock_request, mock_response
+
+    # An event stream never finishes, so its body never resolves
+    stream_request, stream_response = make_exchange(
+        "https://example.com/events",
+        MagicMock(side_effect=lambda: asyncio.get_running_loop().create_future()),
+    )
+
+    # Every poll answer triggers the next poll
+    async def poll_body():
+        poll_request, poll_response = make_exchange(
+            "https://example.com/poll", AsyncMock(side_effect=poll_body)
+        )
+        request_handler(poll_request)
+        response_handler(poll_response)
+        return b"poll"
+
+    poll_request, poll_response = make_exchange(
+        "https://example.com/poll", AsyncMock(side_effect=poll_body)
+    )
+
+    mock_page = AsyncMock()
+    mock_page.url = "https://example.com"
+    mock_page.title = AsyncMock(return_value="Live Page")
+    mock_page.set_default_timeout = MagicMock()
+    mock_page.on = MagicMock(side_effect=on_handler)
+
+    async def mock_goto(*args, **kwargs):
+        for mock_request, mock_response in [
+            (stream_request, stream_response),
+            (poll_request, poll_response),
+        ]:
+            request_handler(mock_request)
+            response_handler(mock_response)
+
+    mock_page.goto = mock_goto
+
+    mock_locator = AsyncMock()
+    mock_locator.aria_snapshot = AsyncMock(return_value='button "Refresh"')
+    mock_page.locator = MagicMock(return_value=mock_locator)
+
+    mock_context = AsyncMock()
+    mock_context.new_page = AsyncMock(return_value=mock_page)
+
+    mock_browser = AsyncMock()
+    mock_browser.new_context = AsyncMock(return_value=mock_context)
+    mock_browser.is_connected = MagicMock(return_value=True)
+
+    mock_chromium = AsyncMock()
+    mock_chromium.launch = AsyncMock(return_value=mock_browser)
+
+    mock_playwright = AsyncMock()
+    mock_playwright.chromium = mock_chromium
+
+    with patch("src.tools.snapshot_url.async_playwright") as mock_async_playwright:
+        mock_async_playwright.return_value.start = AsyncMock(
+            return_value=mock_playwright
+        )
+
+        result = await asyncio.wait_for(website_snapshot("https://example.com"), 5)
+
+    assert len(result) == 3
+    assert "✅ Captured snapshot with 1 elements" in result[0].text
+
+    snapshot_text = result[1].text
+    assert "🌐 GET https://example.com/events" in snapshot_text
+    assert "Response: [body unavailable]" in snapshot_text
+    assert "Response: poll" in snapshot_text
+
+
 @pytest.mark.asyncio
 async def test_website_snapshot_invalid_url():
     """Test website snapshot with invalid URL"""
@@ -182,6 +343,17 @@ async def test_website_snapshot_invalid_url():
     assert "Url must be valid, example: https://example.com" in result[0].text
 
 
+def test_is_valid_url_matches_urlparse():
+    """Test URL validation cleans up input the way urlparse does"""
+
+    assert snapshot_url.is_valid_url("https://example.com")
+    assert snapshot_url.is_valid_url(" https://example.com")
+    assert snapshot_url.is_valid_url("ht\ttps://exa\nmple.com")
+    assert not snapshot_url.is_valid_url("http://")
+    assert not snapshot_url.is_valid_url("http://?q")
+    assert not snapshot_url.is_valid_url("mailto:user@example.com")
+
+
 @pytest.mark.asyncio
 async def test_website_snapshot_browser_launch_error():
     """Test website snapshot handles browser launch errors gracefully"""
@@ -189,6 +361,7 @@ async def test_website_snapshot_browser_launch_error():
     # Create a mock browser that has a close method
     mock_browser = AsyncMock()
     mock_browser.close = AsyncMock()
+    mock_browser.is_connected = MagicMock(return_value=True)
 
     mock_chromium = AsyncMock()
     # First call to launch raises exception, but browser is still created for finally block
@@ -203,8 +376,9 @@ async def test_website_snapshot_browser_launch_error():
     )
 
     with patch("src.tools.snapshot_url.async_playwright") as mock_async_playwright:
-        mock_async_playwright.return_value.__aenter__.return_value = mock_playwright
-        mock_async_playwright.return_value.__aexit__.return_value = None
+        mock_async_playwright.return_value.start = AsyncMock(
+            return_value=mock_playwright
+        )
 
         result = await website_snapshot("https://example.com")
 
@@ -213,5 +387,255 @@ async def test_website_snapshot_browser_launch_error():
     assert result[0].type == "text"
     assert "❌ Failed: Browser context creation failed" in result[0].text
 
-    # Verify browser was closed
+    # The shared browser stays open for the next call
+    mock_browser.close.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_website_snapshot_selector_timeout():
+    """Test a page without the expected selectors waits for network idle"""
+
+    mock_page = AsyncMock()
+    mock_page.url = "https://example.com"
+    mock_page.title = AsyncMock(return_value="Plain Page")
+    mock_page.set_default_timeout = MagicMock()
+    mock_page.on = MagicMock()
+    mock_page.wait_for_selector = AsyncMock(side_effect=Exception("Timeout"))
+
+    async def mock_wait_for_load_state(state, **kwargs):
+        if state == "networkidle":
+            raise Exception("Timeout")
+
+    mock_page.wait_for_load_state = AsyncMock(side_effect=mock_wait_for_load_state)
+
+    mock_locator = AsyncMock()
+    mock_locator.aria_snapshot = AsyncMock(return_value='heading "Plain Page"')
+    mock_page.locator = MagicMock(return_value=mock_locator)
+
+    mock_context = AsyncMock()
+    mock_context.new_page = AsyncMock(return_value=mock_page)
+    mock_context.close = AsyncMock()
+
+    mock_browser = AsyncMock()
+    mock_browser.new_context = AsyncMock(return_value=mock_context)
+    mock_browser.is_connected = MagicMock(return_value=True)
+
+    mock_chromium = AsyncMock()
+    mock_chromium.launch = AsyncMock(return_value=mock_browser)
+
+    mock_playwright = AsyncMock()
+    mock_playwright.chromium = mock_chromium
+
+    with patch("src.tools.snapshot_url.async_playwright") as mock_async_playwright:
+        mock_async_playwright.return_value.start = AsyncMock(
+            return_value=mock_playwright
+        )
+
+        result = await website_snapshot("https://example.com")
+
+    assert len(result) == 3
+    assert "✅ Captured snapshot with 0 elements" in result[0].text
+    mock_page.wait_for_load_state.assert_any_call("networkidle", timeout=3000)
+    mock_page.wait_for_timeout.assert_not_called()
+
+
+def test_annotate_and_parse_one_ref_per_line():
+    """Test a line naming several element keywords gets a single ref"""
+
+    annotated, refs, listing = snapshot_url.annotate_and_parse(
+        'button "Open link"\ntext: hello'
+    )
+
+    assert annotated == 'button "Open link" [ref=1]\ntext: hello'
+    assert refs == [{"ref": "1", "element": 'button "Open link"'}]
+    assert listing == '[ref=1]: button "Open link"'
+
+
+def test_annotate_and_parse_last_line_without_newline():
+    """Test the final line is annotated when the snapshot has no trailing newline"""
+
+    annotated, refs, listing = snapshot_url.annotate_and_parse(
+        'heading "Title"\n  - link "Home"'
+    )
+
+    assert annotated == 'heading "Title"\n  - link "Home" [ref=1]'
+    assert refs == [{"ref": "1", "element": '- link "Home"'}]
+    assert listing == '[ref=1]: - link "Home"'
+
+
+def test_annotate_and_parse_empty_snapshot():
+    """Test an empty snapshot has no refs"""
+
+    assert snapshot_url.annotate_and_parse("") == ("", [], "")
+
+
+def test_annotate_and_parse_non_ascii_fallback():
+    """Test snapshots that grow when lowercased are matched line by line"""
+
+    snapshot = 'link "İstanbul"\nlİnk "Ankara"\ntextbox "Şehir"'
+    # "İ" lowercases to two characters, which forces the line-by-line path
+    assert len(snapshot.lower()) != len(snapshot)
+
+    annotated, refs, listing = snapshot_url.annotate_and_parse(snapshot)
+
+    # "lİnk".lower() is "li̇nk", which does not contain "link"
+    assert annotated == (
+        'link "İstanbul" [ref=1]\nlİnk "Ankara"\ntextbox "Şehir" [ref=2]'
+    )
+    assert refs == [
+        {"ref": "1", "element": 'link "İstanbul"'},
+        {"ref": "2", "element": 'textbox "Şehir"'},
+    ]
+    assert listing == '[ref=1]: link "İstanbul"\n[ref=2]: textbox "Şehir"'
+
+
+def test_build_snapshot_output_is_cached():
+    """Test a repeated snapshot reuses the cached, read-only annotation"""
+
+    snapshot_url._build_snapshot_output.cache_clear()
+    snapshot = 'heading "Cached"\nbutton "Again"'
+
+    with patch(
+        "src.tools.snapshot_url.annotate_and_parse",
+        wraps=snapshot_url.annotate_and_parse,
+    ) as mock_annotate:
+        first = snapshot_url._build_snapshot_output(snapshot)
+        second = snapshot_url._build_snapshot_output(snapshot)
+
+    mock_annotate.assert_called_once_with(snapshot)
+    assert second == first
+    annotated, refs, listing = snapshot_url.annotate_and_parse(snapshot)
+    assert first == (annotated, tuple(refs), listing)
+
+    with pytest.raises(TypeError):
+        first[1][0]["element"] = "changed"
+
+
+@pytest.mark.asyncio
+async def test_block_unneeded_resources():
+    """Test images, fonts and media are aborted and everything else continues"""
+
+    for resource_type, blocked in [
+        ("image", True),
+        ("font", True),
+        ("media", True),
+        ("document", False),
+        ("xhr", False),
+        ("stylesheet", False),
+    ]:
+        mock_route = AsyncMock()
+        mock_route.request.resource_type = resource_type
+
+        await snapshot_url._block_unneeded_resources(mock_route)
+
+        if blocked:
+            mock_route.abort.assert_called_once()
+            mock_route.continue_.assert_not_called()
+        else:
+            mock_route.continue_.assert_called_once()
+            mock_route.abort.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_fetch_body_caps_oversized_body():
+    """Test bodies without a usable content-length are cut before decoding"""
+
+    mock_response = Mock()
+    # The 2-byte "é" straddles the cut
+    mock_response.body = AsyncMock(return_value=b"x" * 49999 + "é".encode() + b"y")
+    entry = snapshot_url.NetworkRequest()
+
+    await snapshot_url._fetch_body(entry, mock_response)
+
+    assert entry.response_body == "x" * 49999 + "\ufffd"
+
+
+@pytest.mark.asyncio
+async def test_website_snapshot_reuses_browser():
+    """Test the browser and context are created once and shared across snapshots"""
+
+    mock_page = AsyncMock()
+    mock_page.url = "https://example.com"
+    mock_page.title = AsyncMock(return_value="Example Page")
+    mock_page.set_default_timeout = MagicMock()
+    mock_page.on = MagicMock()
+
+    mock_locator = AsyncMock()
+    mock_locator.aria_snapshot = AsyncMock(return_value='button "Submit"')
+    mock_page.locator = MagicMock(return_value=mock_locator)
+
+    mock_context = AsyncMock()
+    mock_context.new_page = AsyncMock(return_value=mock_page)
+    mock_context.close = AsyncMock()
+
+    mock_browser = AsyncMock()
+    mock_browser.new_context = AsyncMock(return_value=mock_context)
+    mock_browser.close = AsyncMock()
+    mock_browser.is_connected = MagicMock(return_value=True)
+
+    mock_chromium = AsyncMock()
+    mock_chromium.launch = AsyncMock(return_value=mock_browser)
+
+    mock_playwright = AsyncMock()
+    mock_playwright.chromium = mock_chromium
+    mock_playwright.stop = AsyncMock()
+
+    with patch("src.tools.snapshot_url.async_playwright") as mock_async_playwright:
+        mock_async_playwright.return_value.start = AsyncMock(
+            return_value=mock_playwright
+        )
+
+        await website_snapshot("https://example.com")
+        await website_snapshot("https://example.com/other")
+
+    mock_async_playwright.return_value.start.assert_called_once()
+    mock_chromium.launch.assert_called_once()
+    mock_browser.new_context.assert_called_once()
+    assert mock_context.new_page.call_count == 2
+    assert mock_page.close.call_count == 2
+
+    await close_browser()
+
     mock_browser.close.assert_called_once()
+    mock_playwright.stop.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_website_snapshot_relaunches_disconnected_browser():
+    """Test a disconnected browser is relaunched with a fresh context"""
+
+    mock_page = AsyncMock()
+    mock_page.url = "https://example.com"
+    mock_page.title = AsyncMock(return_value="Example Page")
+    mock_page.set_default_timeout = MagicMock()
+    mock_page.on = MagicMock()
+
+    mock_locator = AsyncMock()
+    mock_locator.aria_snapshot = AsyncMock(return_value='button "Submit"')
+    mock_page.locator = MagicMock(return_value=mock_locator)
+
+    mock_context = AsyncMock()
+    mock_context.new_page = AsyncMock(return_value=mock_page)
+
+    mock_browser = AsyncMock()
+    mock_browser.new_context = AsyncMock(return_value=mock_context)
+    mock_browser.is_connected = MagicMock(return_value=True)
+
+    mock_chromium = AsyncMock()
+    mock_chromium.launch = AsyncMock(return_value=mock_browser)
+
+    mock_playwright = AsyncMock()
+    mock_playwright.chromium = mock_chromium
+
+    with patch("src.tools.snapshot_url.async_playwright") as mock_async_playwright:
+        mock_async_playwright.return_value.start = AsyncMock(
+            return_value=mock_playwright
+        )
+
+        await website_snapshot("https://example.com")
+        mock_browser.is_connected.return_value = False
+        await website_snapshot("https://example.com")
+
+    mock_async_playwright.return_value.start.assert_called_once()
+    assert mock_chromium.launch.call_count == 2
+    assert mock_browser.new_context.call_count == 2